@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Drives train.py / test.py exactly like the Electron app does (JSON on stdin,
+# JSON lines on stdout) and records timings so runs can be diffed across releases.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAIN_SCRIPT = os.path.join(BACKEND_DIR, "train.py")
+TEST_SCRIPT = os.path.join(BACKEND_DIR, "test.py")
+
+CSV_STRUCTS = ["mlp", "rnn", "lstm", "rf"]
+IMAGE_STRUCTS = ["cnn"]
+
+
+# === Synthetic datasets ===
+def make_csv_dataset(out_dir, rows, features, classes, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features))
+    weights = rng.normal(size=features)
+    y = np.digitize(X @ weights, np.quantile(X @ weights, np.linspace(0, 1, classes + 1)[1:-1]))
+    columns = [f"f{i}" for i in range(features)]
+    path = os.path.join(out_dir, "synthetic.csv")
+    with open(path, "w") as f:
+        f.write(",".join(columns + ["target"]) + "\n")
+        for row, label in zip(X, y):
+            f.write(",".join(f"{v:.6f}" for v in row) + f",{label}\n")
+    return path, columns
+
+
+def make_image_dataset(out_dir, images_per_class, classes, size=64, seed=0):
+    rng = np.random.default_rng(seed)
+    root = os.path.join(out_dir, "images")
+    for c in range(classes):
+        class_dir = os.path.join(root, f"class_{c}")
+        os.makedirs(class_dir, exist_ok=True)
+        # Give each class its own mean colour so the task is learnable
+        base = rng.integers(0, 256, size=3)
+        for i in range(images_per_class):
+            pixels = np.clip(base + rng.normal(0, 40, size=(size, size, 3)), 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(os.path.join(class_dir, f"{i}.png"))
+    return root
+
+
+# === Process runner ===
+def _run(script, payload, on_line=None, extra_args=()):
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script, *extra_args], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    proc.stdin.write(json.dumps(payload))
+    proc.stdin.close()
+    lines = []
+    for line in proc.stdout:
+        now = time.perf_counter() - start
+        lines.append(line.rstrip("\n"))
+        if on_line:
+            on_line(now, line)
+    peak_kb = None
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        peak_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    else:
+        proc.wait()
+    return time.perf_counter() - start, proc.returncode, lines, peak_kb
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    arr = np.array(values) * 1000
+    return {"p50_ms": float(np.percentile(arr, 50)), "p90_ms": float(np.percentile(arr, 90)),
+            "p99_ms": float(np.percentile(arr, 99)), "mean_ms": float(arr.mean())}
+
+
+# === Benchmarks ===
+def bench_train(config, train_samples):
+    # Process start -> "Parsed config." is interpreter + import cost; from there to
+    # the first training marker is dataset loading and model setup.
+    marks = {"parsed": None, "started": None, "rf_trained": None, "epochs": []}
+
+    def on_line(t, line):
+        try:
+            msg = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        text = str(msg.get("message", ""))
+        if text == "Parsed config.":
+            marks["parsed"] = t
+        elif text in ("Training started.", "Training Random Forest."):
+            marks["started"] = t
+        elif text == "Random Forest trained.":
+            marks["rf_trained"] = t
+        elif text.startswith("Epoch "):
+            marks["epochs"].append(t)
+
+    total, code, lines, peak_kb = _run(TRAIN_SCRIPT, config, on_line)
+    parsed, started = marks["parsed"], marks["started"]
+    epoch_times = np.diff([started] + marks["epochs"]).tolist() if started is not None and marks["epochs"] else []
+    mean_epoch = float(np.mean(epoch_times)) if epoch_times else None
+    fit_s = marks["rf_trained"] - started if marks["rf_trained"] is not None and started is not None else None
+    return {
+        "exit_code": code,
+        "total_s": total,
+        "startup_s": parsed,
+        "load_s": started - parsed if started is not None and parsed is not None else None,
+        "epoch_s": epoch_times,
+        "fit_s": fit_s,  # random forest only: the whole fit, which has no epochs
+        "samples_per_s": train_samples / mean_epoch if mean_epoch else (train_samples / fit_s if fit_s else None),
+        "peak_rss_kb": peak_kb,
+        "error": next((l for l in lines if "[ERROR]" in l), None) if code else None,
+    }
+
+
+def bench_inference(model_path, inputs, runs):
+    payload = {"modelPath": model_path, "inputs": inputs}
+    cold, peak = [], None
+    for _ in range(runs):
+        elapsed, code, lines, peak_kb = _run(TEST_SCRIPT, payload)
+        if code:
+            return {"exit_code": code, "error": lines[-1] if lines else None}
+        cold.append(elapsed)
+        peak = max(peak or 0, peak_kb or 0) or None
+
+    # Warm latency: one long-lived --serve process, one request per line
+    warm, warm_error = [], None
+    proc = subprocess.Popen([sys.executable, TEST_SCRIPT, "--serve"], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            proc.stdin.write(json.dumps(payload) + "\n")
+            proc.stdin.flush()
+            completed = False
+            for line in proc.stdout:
+                if line.startswith("[ERROR]"):
+                    warm_error = line.strip()
+                elif line.startswith('{"type": "complete"'):
+                    completed = True
+                    break
+            if warm_error or not completed:
+                warm_error = warm_error or "test.py --serve exited before completing the request"
+                break
+            warm.append(time.perf_counter() - start)
+    except (BrokenPipeError, OSError) as e:
+        warm_error = f"test.py --serve died: {e}"
+    finally:
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        proc.wait()
+    if warm_error:
+        return {"exit_code": proc.returncode or 1, "cold": _percentiles(cold), "error": warm_error, "peak_rss_kb": peak}
+    return {"exit_code": 0, "cold": _percentiles(cold), "warm": _percentiles(warm[1:]), "peak_rss_kb": peak}
+
+
+def base_config(args, struct, input_type, dataset_path, save_dir):
+    return {
+        "inputType": input_type, "datasetPath": dataset_path, "modelStruct": struct,
+        "modelType": "classification", "saveLocation": save_dir, "epochs": args.epochs,
+        "batchSize": args.batch_size, "padding": 1, "kernelSize": 3,
+        "layerSize": args.layer_size, "numLayers": args.num_layers,
+        "preprocessing": {"normalize": True},
+    }
+
+
+def run_suite(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="customl-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    results = {"meta": {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": vars(args),
+    }, "runs": {}}
+    try:
+        import torch
+        results["meta"]["torch"] = torch.__version__
+    except ImportError:
+        pass
+
+    structs = [s.strip().lower() for s in args.structs.split(",")]
+    csv_path = image_root = None
+    if any(s in CSV_STRUCTS for s in structs):
+        t = time.perf_counter()
+        csv_path, columns = make_csv_dataset(workdir, args.rows, args.features, args.classes)
+        results["meta"]["csv_generate_s"] = time.perf_counter() - t
+    if any(s in IMAGE_STRUCTS for s in structs):
+        t = time.perf_counter()
+        image_root = make_image_dataset(workdir, args.images_per_class, args.classes)
+        results["meta"]["images_generate_s"] = time.perf_counter() - t
+
+    for struct in structs:
+        print(f"[bench] {struct}", file=sys.stderr)
+        save_dir = os.path.join(workdir, f"model_{struct}")
+        if struct in CSV_STRUCTS:
+            config = base_config(args, struct, "csv", csv_path, save_dir)
+            config.update({"inputColumns": columns, "targetColumn": "target"})
+            train_samples = int(0.8 * args.rows)
+            sample = {col: 0.0 for col in columns}
+        elif struct in IMAGE_STRUCTS:
+            config = base_config(args, struct, "images", image_root, save_dir)
+            train_samples = int(0.8 * args.images_per_class * args.classes)
+            sample = os.path.join(image_root, "class_0", "0.png")
+        else:
+            raise ValueError(f"Unknown modelStruct: {struct}")
+
+        run = {"train": bench_train(config, train_samples)}
+        # Random forests are not persisted by train.py, so there is nothing to serve
+        if struct != "rf" and run["train"]["exit_code"] == 0 and args.inference_runs > 0:
+            run["inference"] = bench_inference(save_dir, sample, args.inference_runs)
+        results["runs"][struct] = run
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark train.py and test.py on synthetic data.")
+    parser.add_argument("--structs", default="mlp,cnn,rnn,lstm,rf")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--features", type=int, default=16)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--images-per-class", type=int, default=200)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--layer-size", type=int, default=64)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--inference-runs", type=int, default=10)
+    parser.add_argument("--workdir", default=None, help="Where datasets and models are written (default: temp dir)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[bench] results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+from torchvision.datasets import ImageFolder
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+# Persistent index of an image-folder dataset, stored next to the images so
+# train.py and test.py don't have to walk and stat the whole tree every run.
+MANIFEST_NAME = ".customl_manifest.json"
+MANIFEST_VERSION = 1
+# exFAT / HFS+ store coarse timestamps, so a directory modified this recently
+# may change again without its mtime moving; such listings are re-read next time.
+MTIME_SLACK = 2.0
+
+
+def _is_image(name):
+    return name.lower().endswith(IMG_EXTENSIONS)
+
+
+class DatasetManifest:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, MANIFEST_NAME)
+        self.dirs = {}   # relative dir -> {"mtime", "trusted", "files": {name: [size, mtime]}, "subdirs": [names]}
+        self.bad = {}    # relative file -> [size, mtime] when it failed to load
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self.dirs = data.get("dirs", {})
+        self.bad = data.get("bad", {})
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "dirs": self.dirs, "bad": self.bad}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError:
+            pass  # read-only dataset folders just don't get a manifest
+
+    # --- Scanning ---
+    def _scan_dir(self, rel_dir):
+        """Return (files, subdirs) for rel_dir, only listing it if its mtime moved."""
+        abs_dir = os.path.join(self.root, rel_dir)
+        mtime = os.stat(abs_dir).st_mtime
+        cached = self.dirs.get(rel_dir)
+        if cached is not None and cached["mtime"] == mtime and cached.get("trusted"):
+            return cached["files"], cached["subdirs"]
+
+        old_files = cached["files"] if cached else {}
+        files, subdirs = {}, []
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                if entry.name == MANIFEST_NAME or entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=True):
+                    subdirs.append(entry.name)
+                elif _is_image(entry.name):
+                    st = entry.stat()
+                    files[entry.name] = [st.st_size, st.st_mtime]
+        subdirs.sort()
+        trusted = time.time() - mtime > MTIME_SLACK
+        if cached is None or files != old_files or subdirs != cached["subdirs"] or trusted != cached.get("trusted"):
+            self.dirty = True
+        self.dirs[rel_dir] = {"mtime": mtime, "trusted": trusted, "files": files, "subdirs": subdirs}
+        return files, subdirs
+
+    def _walk(self, rel_dir, seen):
+        seen.add(rel_dir)
+        files, subdirs = self._scan_dir(rel_dir)
+        for name in sorted(files):
+            yield os.path.join(rel_dir, name) if rel_dir else name, files[name]
+        for sub in subdirs:
+            yield from self._walk(os.path.join(rel_dir, sub) if rel_dir else sub, seen)
+
+    def _recheck_bad(self):
+        # In-place overwrites don't touch the directory mtime, so stat the (few) bad files directly
+        for rel in list(self.bad):
+            try:
+                st = os.stat(os.path.join(self.root, rel))
+            except OSError:
+                del self.bad[rel]
+                self.dirty = True
+                continue
+            stat = [st.st_size, st.st_mtime]
+            if stat != self.bad[rel]:
+                del self.bad[rel]
+                rel_dir, name = os.path.split(rel)
+                if name in self.dirs.get(rel_dir, {}).get("files", {}):
+                    self.dirs[rel_dir]["files"][name] = stat
+                self.dirty = True
+
+    def _prune(self, seen):
+        for rel_dir in list(self.dirs):
+            if rel_dir not in seen:
+                del self.dirs[rel_dir]
+                self.dirty = True
+
+    def refresh(self):
+        """Bring the index up to date; returns (classes, samples) like ImageFolder."""
+        self._recheck_bad()
+        seen = set()
+        _, classes = self._scan_dir("")
+        seen.add("")
+        samples = []
+        for idx, cls in enumerate(classes):
+            for rel_path, stat in self._walk(cls, seen):
+                if self.bad.get(rel_path) == stat:
+                    continue  # known bad and unchanged since
+                samples.append((os.path.join(self.root, rel_path), idx))
+
+        self._prune(seen)
+        if not classes:
+            raise FileNotFoundError(f"Couldn't find any class folder in {self.root}.")
+        return classes, samples
+
+    def image_paths(self):
+        """Every indexed image under root, class folders or not (for batch inference)."""
+        self._recheck_bad()
+        seen = set()
+        paths = [os.path.join(self.root, rel_path) for rel_path, stat in self._walk("", seen)
+                 if self.bad.get(rel_path) != stat]
+        self._prune(seen)
+        return paths
+
+    # --- Bad files ---
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def is_bad(self, path):
+        return self._rel(path) in self.bad
+
+    def mark_bad(self, path):
+        rel = self._rel(path)
+        rel_dir, name = os.path.split(rel)
+        stat = self.dirs.get(rel_dir, {}).get("files", {}).get(name)
+        if stat is not None and self.bad.get(rel) != stat:
+            self.bad[rel] = stat
+            self.dirty = True
+
+
+class ManifestImageFolder(ImageFolder):
+    """ImageFolder whose class list and samples come from a DatasetManifest.
+
+    The loader is called as loader(path, manifest).
+    """
+
+    def __init__(self, root, manifest, **kwargs):
+        self.manifest = manifest
+        super().__init__(root, **kwargs)
+
+    def find_classes(self, directory):
+        self._classes, self._samples = self.manifest.refresh()
+        return self._classes, {cls: i for i, cls in enumerate(self._classes)}
+
+    def make_dataset(self, directory, class_to_idx, *args, **kwargs):
+        return self._samples
+
+    def __getitem__(self, index):
+        # Same as DatasetFolder, but the loader is handed the manifest so it can
+        # skip and record bad files (this also works in spawned worker processes)
+        path, target = self.samples[index]
+        sample = self.loader(path, self.manifest)
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+        return sample, target
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import heapq
+import signal
+import argparse
+import itertools
+import threading
+import subprocess
+
+# Runs several train.py jobs from one long-lived process: a concurrency limit,
+# a per-job thread budget, priorities and cancellation. Each job is its own
+# train.py process with a private stdout pipe, so every message it (or any
+# data-parallel rank it spawns) emits is forwarded tagged with its jobId.
+
+sys.stdout.reconfigure(line_buffering=True)
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train.py")
+
+_print_lock = threading.Lock()
+
+
+def emit(message):
+    with _print_lock:
+        print(json.dumps(message))
+        sys.stdout.flush()
+
+
+class TrainingJobRunner:
+    def __init__(self, max_concurrent=1, threads_per_job=None, train_command=None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.threads_per_job = int(threads_per_job or max(1, (os.cpu_count() or 1) // self.max_concurrent))
+        self.train_command = train_command or [sys.executable, TRAIN_SCRIPT]
+        self.jobs = {}      # jobId -> {"status", "priority", "config", "process"}
+        self.pending = []   # heap of (-priority, seq, jobId)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    # --- Public API ---
+    def submit(self, config, priority=0, job_id=None):
+        with self.cond:
+            job_id = str(job_id or f"job-{next(self.seq)}")
+            if job_id in self.jobs:
+                raise ValueError(f"Duplicate jobId: {job_id}")
+            self.jobs[job_id] = {"status": "queued", "priority": priority, "config": config, "process": None}
+            heapq.heappush(self.pending, (-priority, next(self.seq), job_id))
+            self._status(job_id, "queued")
+            self._start_pending()
+        return job_id
+
+    def cancel(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] not in ("queued", "running"):
+                return False
+            if job["process"] is not None:
+                self._kill(job["process"])
+            self._finish(job_id, "cancelled")
+            self._start_pending()
+            return True
+
+    def status(self):
+        with self.cond:
+            return {job_id: job["status"] for job_id, job in self.jobs.items()}
+
+    def wait(self):
+        with self.cond:
+            while any(job["status"] in ("queued", "running") for job in self.jobs.values()):
+                self.cond.wait()
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            for job_id in list(self.jobs):
+                self.cancel(job_id)
+
+    # --- Internals ---
+    def _status(self, job_id, status):
+        emit({"type": "job", "jobId": job_id, "status": status})
+
+    def _finish(self, job_id, status):
+        job = self.jobs[job_id]
+        if job["status"] in ("queued", "running"):
+            job["status"] = status
+            self._status(job_id, status)
+            self.cond.notify_all()
+
+    def _running(self):
+        return sum(1 for job in self.jobs.values() if job["status"] == "running")
+
+    def _kill(self, proc):
+        # Take down data-parallel ranks too, not just the train.py parent
+        if os.name == "posix":
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.terminate()
+
+    def _start_pending(self):
+        while not self.closed and self.pending and self._running() < self.max_concurrent:
+            _, _, job_id = heapq.heappop(self.pending)
+            job = self.jobs[job_id]
+            if job["status"] != "queued":
+                continue  # cancelled while waiting
+            threads = str(self.threads_per_job)
+            env = dict(os.environ, CUSTOML_NUM_THREADS=threads, OMP_NUM_THREADS=threads, MKL_NUM_THREADS=threads)
+            job["process"] = subprocess.Popen(
+                self.train_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                env=env, text=True, start_new_session=(os.name == "posix"))
+            job["status"] = "running"
+            self._status(job_id, "running")
+            threading.Thread(target=self._pump, args=(job_id, job["process"], job["config"]), daemon=True).start()
+
+    def _pump(self, job_id, proc, config):
+        try:
+            proc.stdin.write(json.dumps(config))
+            proc.stdin.close()
+        except OSError:
+            pass  # died on startup; the exit code below reports it
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                message = None
+            if not isinstance(message, dict):
+                message = {"type": "log", "message": line}
+            message["jobId"] = job_id
+            with self.cond:
+                if self.jobs[job_id]["status"] == "cancelled":
+                    continue
+            emit(message)
+        code = proc.wait()
+        with self.cond:
+            self._finish(job_id, "done" if code == 0 else "failed")
+            self._start_pending()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue and run train.py jobs. Reads one JSON command per stdin line.")
+    parser.add_argument("--max-concurrent", type=int, default=1)
+    parser.add_argument("--threads-per-job", type=int, default=None)
+    parser.add_argument("--train-command", default=None,
+                        help="JSON list used to start a training job (default: this Python running train.py)")
+    args = parser.parse_args()
+
+    train_command = json.loads(args.train_command) if args.train_command else None
+    runner = TrainingJobRunner(args.max_concurrent, args.threads_per_job, train_command)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            command = json.loads(line)
+            action = command.get("action")
+            if action == "submit":
+                runner.submit(command["config"], int(command.get("priority", 0)), command.get("jobId"))
+            elif action == "cancel":
+                if not runner.cancel(command["jobId"]):
+                    emit({"type": "log", "jobId": command["jobId"], "message": "Job is not queued or running."})
+            elif action == "status":
+                emit({"type": "status", "jobs": runner.status()})
+            else:
+                raise ValueError(f"Unknown action: {action}")
+        except Exception as e:
+            emit({"type": "log", "message": f"[ERROR] {e}"})
+    # stdin closed: let queued work finish before exiting
+    runner.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import json
+import struct
+import numpy as np
+import torch
+
+# Single-file saved model in the safetensors layout:
+#   8-byte little-endian header length | JSON header | raw tensor bytes
+# The header's __metadata__ holds config.json and the class index -> name map;
+# scaler statistics are stored as ordinary tensors, so loading needs neither
+# pickle nor sklearn.
+BUNDLE_NAME = "model.safetensors"
+SCALER_PREFIX = "__scaler__."
+ALIGNMENT = 8
+
+_DTYPES = {
+    torch.float32: ("F32", np.float32),
+    torch.float64: ("F64", np.float64),
+    torch.float16: ("F16", np.float16),
+    torch.int64: ("I64", np.int64),
+    torch.int32: ("I32", np.int32),
+    torch.uint8: ("U8", np.uint8),
+    torch.bool: ("BOOL", np.bool_),
+}
+_NP_BY_NAME = {name: np_dtype for name, np_dtype in _DTYPES.values()}
+
+
+class ArrayScaler:
+    """Inference-only StandardScaler: (x - mean_) / scale_."""
+
+    def __init__(self, mean=None, scale=None):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, data):
+        if self.mean_ is not None:
+            data = data - self.mean_
+        if self.scale_ is not None:
+            data = data / self.scale_
+        return data
+
+
+def save_bundle(path, state_dict, config, scaler=None, class_names=None):
+    tensors = {name: t.detach().cpu().contiguous() for name, t in state_dict.items()}
+    if scaler is not None:
+        for attr in ("mean_", "scale_"):
+            arr = getattr(scaler, attr, None)
+            if arr is not None:
+                tensors[SCALER_PREFIX + attr.rstrip("_")] = torch.from_numpy(np.ascontiguousarray(arr, dtype=np.float64))
+
+    header = {"__metadata__": {"format": "customl-bundle-1", "config": json.dumps(config)}}
+    if class_names is not None:
+        header["__metadata__"]["class_map"] = json.dumps({str(i): name for i, name in enumerate(class_names)})
+    # Widest dtypes first (as safetensors does) keeps every tensor aligned to its element size
+    tensors = dict(sorted(tensors.items(), key=lambda item: -item[1].element_size()))
+    offset = 0
+    for name, t in tensors.items():
+        if t.dtype not in _DTYPES:
+            raise ValueError(f"Unsupported tensor dtype for bundle: {name} ({t.dtype})")
+        nbytes = t.numel() * t.element_size()
+        header[name] = {"dtype": _DTYPES[t.dtype][0], "shape": list(t.shape), "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    # Pad so the tensor data starts on an aligned boundary, as safetensors does
+    header_bytes += b" " * (-(8 + len(header_bytes)) % ALIGNMENT)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for t in tensors.values():
+            f.write(t.numpy().tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_bundle(path):
+    """Return (config, state_dict, scaler); tensors are copy-on-write memory maps of the file."""
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    data_start = 8 + header_len
+    metadata = header.pop("__metadata__", {})
+    config = json.loads(metadata["config"])
+    if "class_map" in metadata:
+        config["classMap"] = json.loads(metadata["class_map"])
+
+    state_dict, scaler_arrays = {}, {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        np_dtype = _NP_BY_NAME[info["dtype"]]
+        shape = tuple(info["shape"])
+        if end == start:
+            arr = np.zeros(shape, dtype=np_dtype)
+        else:
+            # mode "c": pages are shared with the OS cache until something writes to them
+            arr = np.memmap(path, dtype=np_dtype, mode="c", offset=data_start + start, shape=shape)
+        if name.startswith(SCALER_PREFIX):
+            scaler_arrays[name[len(SCALER_PREFIX):]] = np.asarray(arr)
+        else:
+            state_dict[name] = torch.from_numpy(arr)
+
+    scaler = None
+    if scaler_arrays:
+        scaler = ArrayScaler(scaler_arrays.get("mean"), scaler_arrays.get("scale"))
+    return config, state_dict, scaler
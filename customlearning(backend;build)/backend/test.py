@@ -8,6 +8,9 @@ import torchvision.transforms as T
 import torch.nn as nn
 import torch.nn.functional as F
 import pickle
+from collections import OrderedDict
+from dataset_manifest import DatasetManifest
+from model_bundle import BUNDLE_NAME, load_bundle
 
 # --- Config loader ---
 def load_config(model_path):
@@ -16,7 +19,7 @@ def load_config(model_path):
         return json.load(f)
 
 # --- Dynamic model loader ---
-def load_model(model_path, config):
+def load_model(model_path, config, state_dict=None):
     model_code = config.get("model_class_code")
     if not model_code:
         raise ValueError("No model_class_code found in config.json")
@@ -47,17 +50,24 @@ def load_model(model_path, config):
     else:
         raise ValueError(f"Unsupported modelStruct: {struct}")
 
-    model.load_state_dict(torch.load(os.path.join(model_path, "model.pth"), map_location="cpu"))
+    if state_dict is None:
+        model.load_state_dict(torch.load(os.path.join(model_path, "model.pth"), map_location="cpu"))
+    else:
+        model.load_state_dict(state_dict, assign=True)  # keep the bundle's memory-mapped tensors
     model.eval()
     return model
 
 # --- Preprocessing ---
-def preprocess_csv(config, input_dict, model_path):
-    data = np.array([[float(input_dict[col]) for col in config["inputColumns"]]])
+def load_scaler(model_path):
     scaler_path = os.path.join(model_path, "scaler.pkl")
-    if os.path.exists(scaler_path):
-        with open(scaler_path, "rb") as f:
-            scaler = pickle.load(f)
+    if not os.path.exists(scaler_path):
+        return None
+    with open(scaler_path, "rb") as f:
+        return pickle.load(f)
+
+def preprocess_csv(config, input_dict, scaler):
+    data = np.array([[float(input_dict[col]) for col in config["inputColumns"]]])
+    if scaler is not None:
         data = scaler.transform(data)
     return torch.tensor(data, dtype=torch.float32)
 
@@ -71,19 +81,114 @@ def preprocess_image(image_path, model_type="cnn", img_size=(64,64)):
         tensor = tensor.view(1, -1)  # flatten for non-CNN models
     return tensor
 
+def preprocess_series(config, rows, scaler):
+    # rows: list of {column: value} dicts in time order
+    if not isinstance(rows, list):
+        raise ValueError("Windowed models expect 'inputs' to be a list of rows in time order.")
+    data = np.array([[float(row[col]) for col in config["inputColumns"]] for row in rows])
+    if scaler is not None:
+        data = scaler.transform(data)
+    return torch.tensor(data, dtype=torch.float32)
+
+def predict_windows(config, model, rows, scaler, batch_size=256):
+    window = int(config["sequenceWindow"])
+    stride = max(1, int(config.get("sequenceStride", 1)))
+    series = preprocess_series(config, rows, scaler)
+    if len(series) < window:
+        raise ValueError(f"Need at least {window} rows for this model, got {len(series)}.")
+    windows = series.unfold(0, window, stride).transpose(1, 2)  # view, no copy
+    with torch.no_grad():
+        for start in range(0, windows.shape[0], batch_size):
+            output = model(windows[start:start + batch_size].contiguous())
+            for i, out in enumerate(output, start=start):
+                end_row = i * stride + window - 1
+                if config["modelType"] == "classification":
+                    probs = torch.softmax(out, dim=0)
+                    pred = torch.argmax(probs).item()
+                    print(f"Row {end_row} -> Predicted class: {pred}, Confidence: {probs[pred].item():.2%}")
+                else:
+                    print(f"Row {end_row} -> Predicted value: {out.item():.3f}")
+
+# --- Model registry ---
+DEFAULT_CACHE_BUDGET_MB = 512
+
+def _file_mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _model_signature(model_path):
+    # Any change to one of these files invalidates the cached entry
+    return tuple(_file_mtime(os.path.join(model_path, name)) for name in ("config.json", "model.pth", "scaler.pkl", BUNDLE_NAME))
+
+def _estimate_bytes(model, scaler):
+    size = sum(t.numel() * t.element_size() for t in model.state_dict().values())
+    if scaler is not None:
+        for attr in ("mean_", "scale_", "var_"):
+            arr = getattr(scaler, attr, None)
+            if arr is not None:
+                size += arr.nbytes
+    return size
+
+class ModelRegistry:
+    """LRU cache of loaded (config, model, scaler) entries keyed by modelPath."""
+
+    def __init__(self, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get("CUSTOML_MODEL_CACHE_MB", DEFAULT_CACHE_BUDGET_MB))
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, model_path):
+        key = os.path.abspath(model_path)
+        signature = _model_signature(key)
+        entry = self.entries.get(key)
+        if entry is not None and entry["signature"] == signature:
+            self.entries.move_to_end(key)
+            return entry["config"], entry["model"], entry["scaler"]
+        if entry is not None:
+            self._evict(key)
+
+        bundle_path = os.path.join(key, BUNDLE_NAME)
+        if os.path.exists(bundle_path):
+            config, state_dict, scaler = load_bundle(bundle_path)
+            model = load_model(key, config, state_dict)
+        else:
+            config = load_config(key)
+            model = load_model(key, config)
+            scaler = load_scaler(key)
+        size = _estimate_bytes(model, scaler)
+        self.entries[key] = {"config": config, "model": model, "scaler": scaler,
+                             "signature": signature, "size": size}
+        self.total_bytes += size
+        # Always keep the entry just loaded, even if it alone exceeds the budget
+        while self.total_bytes > self.budget_bytes and len(self.entries) > 1:
+            self._evict(next(iter(self.entries)))
+        return config, model, scaler
+
+    def _evict(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["size"]
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+registry = ModelRegistry()
+
 # --- Main ---
-def main():
-    raw = sys.stdin.read()
-    payload = json.loads(raw)
+IMAGE_BATCH_SIZE = 64
+
+def run_inference(payload):
     model_path = payload["modelPath"]
     inputs = payload.get("inputs")  # Can be a single file path (string) or list of paths
 
-    config = load_config(model_path)
-    model = load_model(model_path, config)
+    config, model, scaler = registry.get(model_path)
     struct = config["modelStruct"].lower()
 
-    if config["inputType"] == "csv":
-        x = preprocess_csv(config, inputs, model_path)
+    if config["inputType"] == "csv" and struct in ("rnn", "lstm") and int(config.get("sequenceWindow", 0) or 0) > 1:
+        predict_windows(config, model, inputs, scaler)
+    elif config["inputType"] == "csv":
+        x = preprocess_csv(config, inputs, scaler)
         with torch.no_grad():
             output = model(x)
             if config["modelType"] == "classification":
@@ -97,7 +202,12 @@ def main():
         print(msg)
     else:
         # Ensure inputs is always a list
-        if isinstance(inputs, str):
+        if isinstance(inputs, str) and os.path.isdir(inputs):
+            # A whole folder: use (and refresh) its manifest instead of walking it
+            folder_manifest = DatasetManifest(inputs)
+            image_paths = folder_manifest.image_paths()
+            folder_manifest.save()
+        elif isinstance(inputs, str):
             image_paths = [inputs]
         elif isinstance(inputs, list):
             image_paths = inputs
@@ -108,19 +218,42 @@ def main():
             print("No images provided.")
             return
 
-        for path in image_paths:
-            x = preprocess_image(path, model_type=struct)
+        for start in range(0, len(image_paths), IMAGE_BATCH_SIZE):
+            batch_paths = image_paths[start:start + IMAGE_BATCH_SIZE]
+            x = torch.cat([preprocess_image(path, model_type=struct) for path in batch_paths])
             with torch.no_grad():
                 output = model(x)
+            for path, out in zip(batch_paths, output):
                 if config["modelType"] == "classification":
-                    probs = torch.softmax(output, dim=1)
-                    pred = torch.argmax(probs, dim=1).item()
-                    confidence = probs[0][pred].item()
+                    probs = torch.softmax(out, dim=0)
+                    pred = torch.argmax(probs).item()
+                    confidence = probs[pred].item()
                     msg = f"{os.path.basename(path)} -> Predicted class: {pred}, Confidence: {confidence:.2%}"
                 else:
-                    pred = output.item()
+                    pred = out.item()
                     msg = f"{os.path.basename(path)} -> Predicted value: {pred:.3f}"
-            print(msg)
+                print(msg)
+
+def serve():
+    # Long-lived mode: one JSON request per line, models stay warm in the registry
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            run_inference(json.loads(line))
+        except Exception as e:
+            print(f"[ERROR] {e}")
+        print(json.dumps({"type": "complete", "message": "done"}))
+        sys.stdout.flush()
+
+def main():
+    if "--serve" in sys.argv[1:]:
+        serve()
+        return
+    raw = sys.stdin.read()
+    payload = json.loads(raw)
+    run_inference(payload)
 
 if __name__ == "__main__":
     main()
@@ -5,10 +5,17 @@ import time
 import traceback
 import torch
 import inspect
+import math
+import copy
+import socket
+import contextlib
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, TensorDataset, random_split
-import torchvision
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import DataLoader, TensorDataset, Subset, WeightedRandomSampler
+from torch.utils.data.distributed import DistributedSampler
 import torchvision.transforms as transforms
 import pandas as pd
 import numpy as np
@@ -16,25 +23,33 @@ import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-import pickle
 import base64
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, r2_score, mean_squared_error, mean_absolute_error, accuracy_score
+from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, r2_score, mean_squared_error
 import sys
 sys.stdout.reconfigure(line_buffering=True)  # ensures flush after every print
 from PIL import Image
+from dataset_manifest import DatasetManifest, ManifestImageFolder
+from model_bundle import BUNDLE_NAME, save_bundle
 
 # === Electron IPC ===
 def send_log(message): print(json.dumps({"type": "log", "message": message})); sys.stdout.flush()
 def send_progress(percent): print(json.dumps({"type": "progress", "message": str(percent)})); sys.stdout.flush()
 def send_complete(): print(json.dumps({"type": "complete", "message": "done"})); sys.stdout.flush()
 def send_graph(path): print(json.dumps({"type": "graph", "path": path})); sys.stdout.flush()
+def send_metric(name, value): print(json.dumps({"type": "metric", "name": name, "value": value})); sys.stdout.flush()
 
 
-def safe_loader(path):
+def safe_loader(path, manifest=None):
+    if manifest is not None and manifest.is_bad(path):
+        return Image.new("RGB", (32, 32), (0, 0, 0))
     try:
         return Image.open(path).convert("RGB")
     except Exception as e:
-        send_log(f"Skipping bad image: {path} ({e})")
+        # Data-parallel ranks share the log; only rank 0 speaks
+        if not (dist.is_initialized() and dist.get_rank() != 0):
+            send_log(f"Skipping bad image: {path} ({e})")
+        if manifest is not None:
+            manifest.mark_bad(path)
         return Image.new("RGB", (32, 32), (0, 0, 0))  # dummy black image
 
 model_class_code = ""
@@ -111,8 +126,354 @@ class LSTM(nn.Module):
         return self.fc(out[:, -1, :])  # use last time step
 """
 
+def make_windows(X, y, window, stride):
+    """Zero-copy [num_windows, window, features] view over X, labelled by each window's last row."""
+    if len(X) < window:
+        raise ValueError(f"Need at least {window} rows for a window of length {window}, got {len(X)}.")
+    windows = X.unfold(0, window, stride).transpose(1, 2)
+    targets = y[window - 1::stride][:windows.shape[0]]
+    return windows, targets
+
+# === Splitting + Sampling ===
+def stratified_split(targets, val_fraction, seed):
+    """Per-class shuffled split of sample indices; only needs the labels, not the samples."""
+    targets = np.asarray(targets)
+    rng = np.random.default_rng(seed)
+    train_idx, val_idx = [], []
+    for c in np.unique(targets):
+        idx = rng.permutation(np.flatnonzero(targets == c))
+        n_val = int(round(len(idx) * val_fraction))
+        if len(idx) > 1:
+            n_val = min(max(n_val, 1), len(idx) - 1)
+        val_idx.append(idx[:n_val])
+        train_idx.append(idx[n_val:])
+    return rng.permutation(np.concatenate(train_idx)), rng.permutation(np.concatenate(val_idx))
+
+def make_train_loader(train_ds, batch_size, seed, balance_targets=None):
+    generator = torch.Generator().manual_seed(seed)
+    if balance_targets is None:
+        return DataLoader(train_ds, batch_size=batch_size, shuffle=True, generator=generator)
+    # Draw every class equally often by weighting samples with 1 / class count
+    targets = torch.as_tensor(np.asarray(balance_targets), dtype=torch.long)
+    class_counts = torch.bincount(targets).clamp(min=1)
+    weights = (1.0 / class_counts.double())[targets]
+    sampler = WeightedRandomSampler(weights, num_samples=len(targets), replacement=True, generator=generator)
+    return DataLoader(train_ds, batch_size=batch_size, sampler=sampler)
+
+def build_model(struct, config, input_size, output_size):
+    layer_size = int(config["layerSize"])
+    num_layers = int(config["numLayers"])
+    kernel_size = int(config["kernelSize"])
+    padding = int(config["padding"])
+
+    if struct == "mlp" or struct == "fnn":
+        exec(MLP_CODE, globals())
+        MLP_class = globals()["MLP"]
+        return MLP_class(input_size, layer_size, num_layers, output_size), MLP_CODE
+    elif struct == "cnn":
+        conv_configs = [
+            {
+                "out_channels": layer_size,
+                "kernel_size": kernel_size,
+                "padding": padding
+            }
+            for _ in range(num_layers)
+        ]
+        exec(CNN_CODE, globals())
+        CNN_class = globals()["CNN"]
+        return CNN_class(3, output_size, conv_configs), CNN_CODE
+    elif struct == "rnn":
+        exec(RNN_CODE, globals())
+        RNN_class = globals()["RNN"]
+        return RNN_class(input_size, layer_size, num_layers, output_size), RNN_CODE
+    elif struct == "lstm":
+        exec(LSTM_CODE, globals())
+        LSTM_class = globals()["LSTM"]
+        return LSTM_class(input_size, layer_size, num_layers, output_size), LSTM_CODE
+    else:
+        raise ValueError(f"Unsupported modelStruct: {struct}")
+
+# === Learning rate ===
+DEFAULT_LR = 1e-3  # Adam's default
+
+def scaled_lr(config):
+    """Base LR, scaled up from baseBatchSize to batchSize when lrScaling is set."""
+    lr = float(config.get("learningRate", DEFAULT_LR))
+    rule = str(config.get("lrScaling", "none")).lower()
+    ratio = int(config["batchSize"]) / int(config.get("baseBatchSize", 32))
+    if rule == "linear":
+        return lr * ratio
+    elif rule == "sqrt":
+        return lr * math.sqrt(ratio)
+    elif rule in ("none", ""):
+        return lr
+    raise ValueError(f"Unsupported lrScaling: {rule}")
+
+def make_optimizer(model, config, lr, epochs, steps_per_epoch):
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    schedule = str(config.get("lrSchedule", "none")).lower()
+    total_steps = max(1, epochs * steps_per_epoch)
+    warmup_steps = int(float(config.get("warmupEpochs", 1 if schedule == "warmup" else 0)) * steps_per_epoch)
+
+    if schedule == "onecycle":
+        return optimizer, torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, total_steps=total_steps)
+    elif schedule == "cosine":
+        def factor(step):
+            if step < warmup_steps:
+                return (step + 1) / warmup_steps
+            progress = (step - warmup_steps) / max(1, total_steps - warmup_steps)
+            return 0.5 * (1 + math.cos(math.pi * min(progress, 1.0)))
+    elif schedule == "warmup":
+        def factor(step):
+            return min(1.0, (step + 1) / max(1, warmup_steps))
+    elif schedule in ("none", ""):
+        return optimizer, None
+    else:
+        raise ValueError(f"Unsupported lrSchedule: {schedule}")
+    return optimizer, torch.optim.lr_scheduler.LambdaLR(optimizer, factor)
+
+def find_lr(model, train_loader, criterion, model_type, start_lr=1e-7, end_lr=1.0, num_iters=100):
+    """LR range test: ramp the LR exponentially, then pick a tenth of the LR at the lowest loss."""
+    state = copy.deepcopy(model.state_dict())
+    optimizer = torch.optim.Adam(model.parameters(), lr=start_lr)
+    gamma = (end_lr / start_lr) ** (1 / (num_iters - 1))
+    lrs, losses = [], []
+    avg_loss, best_loss = 0.0, float("inf")
+    model.train()
+    batches = iter(train_loader)
+    for step in range(num_iters):
+        try:
+            x, y = next(batches)
+        except StopIteration:
+            batches = iter(train_loader)
+            x, y = next(batches)
+        lr = start_lr * gamma ** step
+        for group in optimizer.param_groups:
+            group["lr"] = lr
+        optimizer.zero_grad()
+        output = model(x)
+        if model_type == "regression": output = output.squeeze()
+        loss = criterion(output, y)
+        loss.backward()
+        optimizer.step()
+
+        avg_loss = 0.98 * avg_loss + 0.02 * loss.item()
+        smoothed = avg_loss / (1 - 0.98 ** (step + 1))
+        if not math.isfinite(smoothed) or smoothed > 4 * best_loss:
+            break  # diverged
+        best_loss = min(best_loss, smoothed)
+        lrs.append(lr)
+        losses.append(smoothed)
+    model.load_state_dict(state)
+    if not lrs:
+        return DEFAULT_LR
+    return lrs[int(np.argmin(losses))] / 10
+
+# === Memory-bounded batch size ===
+def default_memory_budget_mb():
+    # Half of physical RAM where the OS tells us, otherwise a conservative 2 GB
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 2048
+    return total / (1024 * 1024) / 2
+
+def _trial_step_bytes(model, criterion, model_type, x, y):
+    """Run one forward/backward pass and count the bytes autograd kept alive for it."""
+    saved = [x.numel() * x.element_size()]
+    def pack(t):
+        saved[0] += t.numel() * t.element_size()
+        return t
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        output = model(x)
+        if model_type == "regression": output = output.squeeze()
+        loss = criterion(output, y)
+    saved[0] += output.numel() * output.element_size()
+    loss.backward()
+    model.zero_grad(set_to_none=True)
+    return saved[0]
+
+def _is_out_of_memory(e):
+    if isinstance(e, MemoryError):
+        return True
+    text = str(e).lower()
+    return "out of memory" in text or "not enough memory" in text or "can't allocate memory" in text
+
+def fit_batch_size(model, criterion, model_type, train_ds, requested, budget_bytes):
+    """Largest batch size <= requested whose trial step fits the budget, found by doubling."""
+    # Weights + gradients + Adam's two moment buffers
+    fixed = 4 * sum(p.numel() * p.element_size() for p in model.parameters())
+    probe = [train_ds[i] for i in range(min(len(train_ds), 8))]
+    xs = torch.stack([p[0] for p in probe])
+    ys = torch.stack([torch.as_tensor(p[1]) for p in probe])
+
+    best, best_bytes, batch = 0, fixed, 1
+    used, oom = None, False
+    model.train()
+    while True:
+        idx = torch.arange(batch) % len(probe)
+        try:
+            used = fixed + _trial_step_bytes(model, criterion, model_type, xs[idx], ys[idx])
+        except (RuntimeError, MemoryError) as e:
+            model.zero_grad(set_to_none=True)
+            if not _is_out_of_memory(e):
+                raise  # a real model error (e.g. shape mismatch), not "doesn't fit"
+            oom = True
+            break
+        if used > budget_bytes:
+            break
+        best, best_bytes = batch, used
+        if batch >= requested:
+            break
+        next_batch = min(batch * 2, requested)
+        # Activations grow with the batch; don't run a trial that is already
+        # expected to overshoot the budget (the trial itself would use that memory)
+        if fixed + (used - fixed) * next_batch / batch > budget_bytes:
+            break
+        batch = next_batch
+    if best == 0:
+        needed = "more memory than is available" if oom else f"about {used / 2**20:.0f} MB"
+        raise MemoryError(
+            f"This model needs {needed} to train even with a batch size of 1, "
+            f"over the {budget_bytes / 2**20:.0f} MB budget. Try a smaller layerSize or numLayers."
+        )
+    return best, best_bytes
+
+def train_epochs(model, train_loader, criterion, optimizer, epochs, model_type,
+                 accum_steps=1, sampler=None, rank=0, world_size=1, scheduler=None):
+    losses = []
+    for epoch in range(epochs):
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        total_loss = 0
+        optimizer.zero_grad()
+        for i, (x, y) in enumerate(train_loader):
+            step_now = (i + 1) % accum_steps == 0 or i + 1 == len(train_loader)
+            # Skip the DDP gradient all-reduce on accumulation-only steps
+            sync = model.no_sync() if world_size > 1 and not step_now else contextlib.nullcontext()
+            with sync:
+                output = model(x)
+                if model_type == "regression": output = output.squeeze()
+                loss = criterion(output, y)
+                (loss / accum_steps).backward()
+            if step_now:
+                optimizer.step()
+                optimizer.zero_grad()
+                if scheduler is not None:
+                    scheduler.step()
+            total_loss += loss.item()
+        avg_loss = total_loss / len(train_loader)
+        if world_size > 1:
+            loss_t = torch.tensor([avg_loss])
+            dist.all_reduce(loss_t)
+            avg_loss = loss_t.item() / world_size
+        losses.append(avg_loss)
+        if rank == 0:
+            send_log(f"Epoch {epoch+1}: Loss = {avg_loss:.4f}")
+            send_progress(int((epoch+1)/epochs*100))
+    return losses
+
+# === Evaluation ===
+def evaluate(model, model_type, num_classes, X=None, y=None, loader=None, chunk_size=1024):
+    """One inference-mode pass over the validation split, either tensors (X, y) or a DataLoader."""
+    classification = model_type == "classification"
+    n = len(y) if loader is None else len(loader.dataset)
+    out_dtype = torch.long if classification else torch.float32
+    preds = torch.empty(n, dtype=out_dtype)
+    true = y if loader is None else torch.empty(n, dtype=out_dtype)
+    batches = loader if loader is not None else ((X[i:i + chunk_size], None) for i in range(0, n, chunk_size))
+
+    model.eval()
+    pos = 0
+    with torch.inference_mode():
+        for xb, yb in batches:
+            out = model(xb)
+            out = out.argmax(dim=1) if classification else out.reshape(-1)
+            k = out.shape[0]
+            preds[pos:pos + k] = out
+            if yb is not None:
+                true[pos:pos + k] = yb
+            pos += k
+
+    metrics = {"true": true.numpy(), "preds": preds.numpy()}
+    if classification:
+        cm = torch.bincount(true * num_classes + preds, minlength=num_classes * num_classes)
+        cm = cm.reshape(num_classes, num_classes)
+        metrics["confusion_matrix"] = cm.numpy()
+        metrics["accuracy"] = cm.diagonal().sum().item() / max(n, 1)
+    else:
+        err = preds - true
+        ss_tot = ((true - true.mean()) ** 2).sum().item()
+        metrics["mae"] = err.abs().mean().item()
+        metrics["r2"] = 1 - (err ** 2).sum().item() / ss_tot if ss_tot > 0 else 0.0
+    return metrics
+
+# === Data-parallel training ===
+def thread_budget():
+    # Set by job_runner.py to cap a job's threads; otherwise use every core
+    return int(os.environ.get("CUSTOML_NUM_THREADS") or os.cpu_count() or 1)
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _ddp_worker(rank, world_size, port, config, input_size, output_size, train_ds, accum_steps, lr, result_path):
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    # Split the thread budget between ranks instead of letting each one grab all of them
+    torch.set_num_threads(max(1, thread_budget() // world_size))
+    seed = int(config.get("seed", 42))
+    torch.manual_seed(seed)
+    # Each rank gets its own pickled copy of the manifest; collect what it marks bad
+    manifest = getattr(getattr(train_ds, "dataset", None), "manifest", None)
+    known_bad = set(manifest.bad) if manifest is not None else set()
+    try:
+        model_type = config["modelType"]
+        model, _ = build_model(config["modelStruct"], config, input_size, output_size)
+        ddp_model = DDP(model)
+        sampler = DistributedSampler(train_ds, num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+        micro_batch = max(1, int(config["batchSize"]) // (world_size * accum_steps))
+        train_loader = DataLoader(train_ds, batch_size=micro_batch, sampler=sampler)
+        criterion = nn.CrossEntropyLoss() if model_type == "classification" else nn.MSELoss()
+        epochs = int(config["epochs"])
+        optimizer, scheduler = make_optimizer(ddp_model, config, lr, epochs, math.ceil(len(train_loader) / accum_steps))
+        ddp_model.train()
+        losses = train_epochs(ddp_model, train_loader, criterion, optimizer, epochs, model_type,
+                              accum_steps=accum_steps, sampler=sampler, rank=rank, world_size=world_size,
+                              scheduler=scheduler)
+        found_bad = [os.path.join(manifest.root, rel) for rel in manifest.bad if rel not in known_bad] if manifest is not None else []
+        gathered = [None] * world_size
+        dist.all_gather_object(gathered, found_bad)
+        if rank == 0:
+            bad_images = sorted({p for paths in gathered for p in paths})
+            torch.save({"state_dict": model.state_dict(), "losses": losses, "bad_images": bad_images}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+def train_data_parallel(model, config, input_size, output_size, train_ds, world_size, accum_steps, lr, save_dir):
+    send_log(f"Data-parallel training on {world_size} processes (gloo).")
+    result_path = os.path.join(save_dir, "_ddp_result.pt")
+    mp.spawn(_ddp_worker,
+             args=(world_size, _free_port(), config, input_size, output_size, train_ds, accum_steps, lr, result_path),
+             nprocs=world_size, join=True)
+    result = torch.load(result_path)
+    os.remove(result_path)
+    model.load_state_dict(result["state_dict"])
+    manifest = getattr(getattr(train_ds, "dataset", None), "manifest", None)
+    if manifest is not None and result.get("bad_images"):
+        send_log(f"Recorded {len(result['bad_images'])} unreadable image(s) found by the training ranks.")
+        for bad_path in result["bad_images"]:
+            manifest.mark_bad(bad_path)
+    return result["losses"]
+
 def main():
+    manifest = None
     scaler = None
+    config = {}
+    if os.environ.get("CUSTOML_NUM_THREADS"):
+        torch.set_num_threads(thread_budget())
     try:
         config = json.loads(sys.stdin.read())
         send_log("Parsed config.")
@@ -130,6 +491,11 @@ def main():
         path = config["datasetPath"]
         save_dir = config["saveLocation"]
         os.makedirs(save_dir, exist_ok=True)
+        seed = int(config.get("seed", 42))
+        torch.manual_seed(seed)
+        stratify = model_type == "classification" and config.get("stratify", True)
+        class_names = None
+        train_targets = None
 
 
         # === Dataset Load and Preprocessing ===
@@ -151,7 +517,9 @@ def main():
                 X = scaler.fit_transform(X)
 
             if model_type == "classification":
-                y = LabelEncoder().fit_transform(y)
+                encoder = LabelEncoder()
+                y = encoder.fit_transform(y)
+                class_names = [str(c) for c in encoder.classes_]
                 output_size = len(np.unique(y))
                 unique_classes = [int(c) for c in np.unique(y)]
                 
@@ -160,13 +528,30 @@ def main():
             else:
                 output_size = 1
 
-            X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
-            X_train, X_val = map(lambda x: torch.tensor(x, dtype=torch.float32), [X_train, X_val])
-            y_train = torch.tensor(y_train, dtype=torch.long if model_type == "classification" else torch.float32)
-            y_val = torch.tensor(y_val, dtype=torch.long if model_type == "classification" else torch.float32)
+            y_dtype = torch.long if model_type == "classification" else torch.float32
+            window = int(config.get("sequenceWindow", 0) or 0)
+            if struct.lower() in ("rnn", "lstm") and window > 1:
+                # Time series: split chronologically so windows never straddle train/val
+                stride = max(1, int(config.get("sequenceStride", 1)))
+                split = int(0.8 * len(X))
+                X_all = torch.tensor(X, dtype=torch.float32)
+                y_all = torch.tensor(y, dtype=y_dtype)
+                X_train, y_train = make_windows(X_all[:split], y_all[:split], window, stride)
+                X_val, y_val = make_windows(X_all[split:], y_all[split:], window, stride)
+                send_log(f"Windowed series: {len(X_train)} train / {len(X_val)} val windows of length {window}, stride {stride}.")
+            else:
+                if stratify:
+                    train_idx, val_idx = stratified_split(y, 0.2, seed)
+                    X_train, X_val, y_train, y_val = X[train_idx], X[val_idx], y[train_idx], y[val_idx]
+                else:
+                    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=seed)
+                X_train, X_val = map(lambda x: torch.tensor(x, dtype=torch.float32), [X_train, X_val])
+                y_train = torch.tensor(y_train, dtype=y_dtype)
+                y_val = torch.tensor(y_val, dtype=y_dtype)
 
             if struct.lower() == "rf":
-                model = (RandomForestClassifier if model_type == "classification" else RandomForestRegressor)(n_estimators=100)
+                model = (RandomForestClassifier if model_type == "classification" else RandomForestRegressor)(n_estimators=100, random_state=seed)
+                send_log("Training Random Forest.")
                 model.fit(X_train.numpy(), y_train.numpy())
                 send_log("Random Forest trained.")
                 preds = model.predict(X_val.numpy())
@@ -175,132 +560,113 @@ def main():
                 return
 
             train_ds = TensorDataset(X_train, y_train)
-            train_loader = DataLoader(train_ds, batch_size=int(config["batchSize"]), shuffle=True)
+            if model_type == "classification":
+                train_targets = y_train.numpy()
 
         elif input_type == "images":
             transform = transforms.Compose([transforms.Resize((32, 32)), transforms.ToTensor()])
-            dataset = torchvision.datasets.ImageFolder(path, transform=transform, loader=safe_loader)
+            manifest = DatasetManifest(path)
+            dataset = ManifestImageFolder(path, manifest, transform=transform, loader=safe_loader)
+            manifest.save()
+            send_log(f"Indexed {len(dataset)} images in {len(dataset.classes)} classes.")
             num_classes = len(dataset.classes)
-            train_len = int(0.8 * len(dataset))
-            train_ds, val_ds = random_split(dataset, [train_len, len(dataset) - train_len])
-            train_loader = DataLoader(train_ds, batch_size=int(config["batchSize"]), shuffle=True)
+            # Labels come from the folder index, so this never opens an image
+            targets = np.asarray(dataset.targets)
+            if stratify:
+                train_idx, val_idx = stratified_split(targets, 0.2, seed)
+            else:
+                perm = np.random.default_rng(seed).permutation(len(dataset))
+                train_len = int(0.8 * len(dataset))
+                train_idx, val_idx = perm[:train_len], perm[train_len:]
+            train_ds, val_ds = Subset(dataset, train_idx.tolist()), Subset(dataset, val_idx.tolist())
+            train_targets = targets[train_idx]
             val_loader = DataLoader(val_ds, batch_size=int(config["batchSize"]))
             output_size = num_classes
 
             if model_type == "classification":
                 config["classes"] = list(range(output_size))
+                class_names = list(dataset.classes)
         else:
             raise ValueError(f"Unsupported inputType: {input_type}")
 
         # === Build Model ===
-        layer_size = int(config["layerSize"])
-        num_layers = int(config["numLayers"])
-        kernel_size = int(config["kernelSize"])
-        padding = int(config["padding"])
-
-        if struct == "mlp" or struct == "fnn":
-            exec(MLP_CODE, globals())
-            MLP_class = globals()["MLP"]
-            model = MLP_class(X_train.shape[1], layer_size, num_layers, output_size)
-            model_class_code = MLP_CODE
-        elif struct == "cnn":
-            conv_configs = [
-                {
-                    "out_channels": layer_size,
-                    "kernel_size": kernel_size,
-                    "padding": padding
-                }
-                for _ in range(num_layers)
-            ]
-            exec(CNN_CODE, globals())
-            CNN_class = globals()["CNN"]
-            model = CNN_class(3, output_size, conv_configs)
-            model_class_code = CNN_CODE
-        elif struct == "rnn":
-            exec(RNN_CODE, globals())
-            RNN_class = globals()["RNN"]
-            model = RNN_class(X_train.shape[1], layer_size, num_layers, output_size)
-            model_class_code = RNN_CODE
-        elif struct == "lstm":
-            exec(LSTM_CODE, globals())
-            LSTM_class = globals()["LSTM"]
-            model = LSTM_class(X_train.shape[1], layer_size, num_layers, output_size)
-            model_class_code = LSTM_CODE
-        else:
-            raise ValueError(f"Unsupported modelStruct: {struct}")
+        input_size = X_train.shape[-1] if input_type == "csv" else None
+        model, model_class_code = build_model(struct, config, input_size, output_size)
 
         # === Loss + Optimizer ===
+        epochs = int(config["epochs"])
+        world_size = max(1, int(config.get("dataParallel", 1)))
+        accum_steps = max(1, int(config.get("gradAccumSteps", 1)))
+
         criterion = nn.CrossEntropyLoss() if model_type == "classification" else nn.MSELoss()
-        optimizer = torch.optim.Adam(model.parameters())
-        model.train()
+        if config.get("autoBatch"):
+            budget_mb = float(config.get("memoryBudgetMB") or default_memory_budget_mb())
+            per_process = max(1, int(config["batchSize"]) // world_size)
+            fitted, used = fit_batch_size(model, criterion, model_type, train_ds, per_process,
+                                          budget_mb * 2**20 / world_size)
+            accum_steps = math.ceil(per_process / fitted)
+            send_log(f"Auto batch: {fitted} per step x {accum_steps} accumulation steps"
+                     f"{f' x {world_size} processes' if world_size > 1 else ''} "
+                     f"(~{used / 2**20:.0f} MB per process, budget {budget_mb:.0f} MB).")
+            config["autoBatchSize"] = fitted
+            config["autoAccumSteps"] = accum_steps
+        micro_batch = max(1, int(config["batchSize"]) // (world_size * accum_steps))
+        balance = train_targets if config.get("balancedSampling") and model_type == "classification" else None
+        if balance is not None and world_size > 1:
+            send_log("balancedSampling is ignored in data-parallel mode.")
+            balance = None
+        elif balance is not None:
+            send_log(f"Balanced sampling over class counts {np.bincount(balance).tolist()}.")
+        train_loader = make_train_loader(train_ds, micro_batch, seed, balance)
+
+        lr = scaled_lr(config)
+        if config.get("lrFinder"):
+            lr = find_lr(model, train_loader, criterion, model_type)
+            send_log(f"LR finder suggests a learning rate of {lr:.2e}.")
+            send_metric("suggested_lr", lr)
+        config["effectiveLearningRate"] = lr
+        send_log(f"Learning rate: {lr:.2e}, schedule: {config.get('lrSchedule', 'none')}.")
 
         send_log("Training started.")
-        losses = []
-        for epoch in range(int(config["epochs"])):
-            total_loss = 0
-            for batch in train_loader:
-                x, y = batch
-                optimizer.zero_grad()
-                output = model(x)
-                if model_type == "regression": output = output.squeeze()
-                loss = criterion(output, y)
-                loss.backward()
-                optimizer.step()
-                total_loss += loss.item()
-            avg_loss = total_loss / len(train_loader)
-            losses.append(avg_loss)
-            send_log(f"Epoch {epoch+1}: Loss = {avg_loss:.4f}")
-            send_progress(int((epoch+1)/int(config["epochs"])*100))
+        if world_size > 1:
+            losses = train_data_parallel(model, config, input_size, output_size, train_ds, world_size, accum_steps, lr, save_dir)
+        else:
+            optimizer, scheduler = make_optimizer(model, config, lr, epochs, math.ceil(len(train_loader) / accum_steps))
+            model.train()
+            losses = train_epochs(model, train_loader, criterion, optimizer, epochs, model_type,
+                                  accum_steps=accum_steps, scheduler=scheduler)
         # === Evaluation ===
         try:
             config["model_class_code"] = model_class_code
         except Exception as e:
             send_log(f"Failed to get model class source: {e}")
             config["model_class_code"] = "Could not retrieve."  
-        model.eval()
         if input_type == "csv":
-            preds = model(X_val)
-            if model_type == "classification":
-                preds = preds.argmax(dim=1)
-                _save_eval_plots(y_val.numpy(), preds.numpy(), model_type, save_dir)
-                accuracy = accuracy_score(y_val.numpy(), preds.numpy())
-                send_log(f"Validation Accuracy: {accuracy:.4f}")
-                config["evaluation_metric"] = {
-                    "type": "accuracy",
-                    "value": accuracy
-                }
-            else:
-                preds_np = preds.detach().numpy().flatten()
-                _save_eval_plots(y_val.numpy(), preds_np, model_type, save_dir)
-                mae = mean_absolute_error(y_val.numpy(), preds_np)
-                send_log(f"Validation MAE: {mae:.4f}")
-                r2 = r2_score(y_val.numpy(), preds_np)
-                send_log(f"Validation R^2: {r2:.4f}")
-                config["evaluation_metric"] = {
-                    "type": "mae",
-                    "value": mae,
-                    "r^2": r2
-                }
+            eval_type = model_type
+            metrics = evaluate(model, eval_type, output_size, X=X_val, y=y_val)
         else:
-            all_preds, all_labels = [], []
-            for x, y in val_loader:
-                out = model(x)
-                pred = out.argmax(1)
-                all_preds.extend(pred.numpy())
-                all_labels.extend(y.numpy())
-            _save_eval_plots(np.array(all_labels), np.array(all_preds), "classification", save_dir)
-            accuracy = accuracy_score(np.array(all_labels), np.array(all_preds))
-            send_log(f"Validation Accuracy: {accuracy:.4f}")
+            eval_type = "classification"
+            metrics = evaluate(model, eval_type, output_size, loader=val_loader)
+        _save_eval_plots(metrics["true"], metrics["preds"], eval_type, save_dir,
+                         cm=metrics.get("confusion_matrix"), r2=metrics.get("r2"))
+        if eval_type == "classification":
+            send_log(f"Validation Accuracy: {metrics['accuracy']:.4f}")
             config["evaluation_metric"] = {
                 "type": "accuracy",
-                "value": accuracy
+                "value": metrics["accuracy"]
+            }
+        else:
+            send_log(f"Validation MAE: {metrics['mae']:.4f}")
+            send_log(f"Validation R^2: {metrics['r2']:.4f}")
+            config["evaluation_metric"] = {
+                "type": "mae",
+                "value": metrics["mae"],
+                "r^2": metrics["r2"]
             }
 
         # === Save ===
-        torch.save(model.state_dict(), os.path.join(save_dir, "model.pth"))
-        if(scaler):
-            with open(os.path.join(save_dir, "scaler.pkl"), "wb") as f:
-                pickle.dump(scaler, f)
+        if manifest is not None:
+            manifest.save()  # persist any bad images found while training
         plt.figure()
         plt.plot(losses)
         plt.title("Loss Curve")
@@ -313,6 +679,7 @@ def main():
         send_log("Sending graphs: ")
         with open(os.path.join(save_dir, "config.json"), "w") as f:
             json.dump(config, f, indent=2)
+        save_bundle(os.path.join(save_dir, BUNDLE_NAME), model.state_dict(), config, scaler, class_names)
         with open(os.path.join(save_dir, "loss_curve.png"), "rb") as f:
             encoded = "data:image/png;base64," + base64.b64encode(f.read()).decode('utf-8')
             send_log(
@@ -329,11 +696,14 @@ def main():
     except Exception as e:
         error_trace = traceback.format_exc()
         send_log(f"[ERROR] {str(e)}\n{error_trace}")
+        if _is_out_of_memory(e) and not config.get("autoBatch"):
+            send_log("Training ran out of memory. Enable autoBatch to fit the batch size to available memory.")
         sys.exit(1)
 
-def _save_eval_plots(true, pred, task, out_dir):
+def _save_eval_plots(true, pred, task, out_dir, cm=None, r2=None):
     if task == "classification":
-        cm = confusion_matrix(true, pred)
+        if cm is None:
+            cm = confusion_matrix(true, pred)
         disp = ConfusionMatrixDisplay(confusion_matrix=cm)
         fig, ax = plt.subplots()
         disp.plot(ax=ax)
@@ -341,15 +711,17 @@ def _save_eval_plots(true, pred, task, out_dir):
         plt.savefig(cm_path)
         send_graph(cm_path)
     else:
+        if r2 is None:
+            r2 = r2_score(true, pred)
         scatter_path = os.path.join(out_dir, "evaluation.png")
         plt.figure()
         plt.scatter(true, pred, alpha=0.5)
         plt.xlabel("True")
         plt.ylabel("Predicted")
-        plt.title(f"R²: {r2_score(true, pred):.2f}")
+        plt.title(f"R²: {r2:.2f}")
         plt.savefig(scatter_path)
         send_graph(scatter_path)
 
-
 if __name__ == "__main__":
+    mp.freeze_support()  # needed for spawned workers in the PyInstaller build
     main()
@@ -218,7 +218,27 @@ ipcMain.on("train-model", (event, config) => {
 });
 
 // === TEST / INFERENCE ===
-ipcMain.handle("inference:run", async (event, { modelPath, inputs }) => {
+// One long-lived `test --serve` process keeps recently used models loaded.
+// Requests go in as one JSON line each and are answered in order, each answer
+// ending with a {"type": "complete"} line.
+let inferenceProc = null;
+let inferencePending = []; // { resolve, reject } per request, oldest first
+let inferenceBuffer = "";
+let inferenceOutput = [];
+let inferenceStderr = "";
+
+function failInference(err) {
+  const pending = inferencePending;
+  inferenceProc = null;
+  inferencePending = [];
+  inferenceBuffer = "";
+  inferenceOutput = [];
+  for (const { reject } of pending) reject(err);
+}
+
+function getInferenceProcess() {
+  if (inferenceProc) return inferenceProc;
+
   const isDev = !app.isPackaged;
   const testPath = getBackendPath("test", isDev);
 
@@ -226,31 +246,58 @@ ipcMain.handle("inference:run", async (event, { modelPath, inputs }) => {
     throw new Error("Test binary not found at: " + testPath);
   }
 
-  return new Promise((resolve, reject) => {
-    const proc = isDev
-      ? spawn("python", [testPath], { stdio: ["pipe", "pipe", "pipe"] })
-      : spawn(testPath, { stdio: ["pipe", "pipe", "pipe"] });
-
-    let stdout = "", stderr = "";
-
-    proc.stdout.on("data", (chunk) => { stdout += chunk.toString(); });
-    proc.stderr.on("data", (chunk) => { stderr += chunk.toString(); });
-
-    proc.on("error", (err) => reject(err));
-
-    proc.on("close", (code) => {
-      if (code !== 0) {
-        reject(new Error(`Binary exited with code ${code}\nstderr: ${stderr}`));
-      } else {
-        resolve(stdout.trim());
+  const proc = isDev
+    ? spawn("python", [testPath, "--serve"], { stdio: ["pipe", "pipe", "pipe"] })
+    : spawn(testPath, ["--serve"], { stdio: ["pipe", "pipe", "pipe"] });
+  inferenceStderr = "";
+
+  proc.stdout.on("data", (chunk) => {
+    inferenceBuffer += chunk.toString();
+    let newline;
+    while ((newline = inferenceBuffer.indexOf("\n")) !== -1) {
+      const line = inferenceBuffer.slice(0, newline).replace(/\r$/, "");
+      inferenceBuffer = inferenceBuffer.slice(newline + 1);
+      if (!line.startsWith('{"type": "complete"')) {
+        inferenceOutput.push(line);
+        continue;
       }
-    });
+      const output = inferenceOutput;
+      inferenceOutput = [];
+      const request = inferencePending.shift();
+      if (!request) continue;
+      const error = output.find((l) => l.startsWith("[ERROR]"));
+      if (error) request.reject(new Error(error));
+      else request.resolve(output.join("\n").trim());
+    }
+  });
+  proc.stderr.on("data", (chunk) => {
+    inferenceStderr = (inferenceStderr + chunk.toString()).slice(-4000);
+  });
+  proc.on("error", (err) => {
+    if (inferenceProc === proc) failInference(err);
+  });
+  proc.on("close", (code) => {
+    if (inferenceProc === proc) {
+      failInference(new Error(`Binary exited with code ${code}\nstderr: ${inferenceStderr}`));
+    }
+  });
 
-    proc.stdin.write(JSON.stringify({ modelPath, inputs }));
-    proc.stdin.end();
+  inferenceProc = proc;
+  return proc;
+}
+
+ipcMain.handle("inference:run", async (event, { modelPath, inputs }) => {
+  const proc = getInferenceProcess();
+  return new Promise((resolve, reject) => {
+    inferencePending.push({ resolve, reject });
+    proc.stdin.write(JSON.stringify({ modelPath, inputs }) + "\n");
   });
 });
 
+app.on("will-quit", () => {
+  if (inferenceProc) inferenceProc.kill();
+});
+
 ipcMain.handle("config:read", async (event, folderPath) => {
   const configPath = path.join(folderPath, "config.json");
   const raw = await fs.promises.readFile(configPath, "utf-8");